@@ -7,16 +7,47 @@ Optional: ?compact=1 for minified JSON
 
 AGENT_VERSION = "1.0.0"
 
+import asyncio
+import atexit
+import http.client
 import json
 import os
+import platform
 import time
 import socket
 import re
-from http.server import HTTPServer, BaseHTTPRequestHandler
+import shutil
 from datetime import datetime
-from threading import Lock, Thread
+from email.utils import formatdate
+from threading import Lock, local
 from concurrent.futures import ThreadPoolExecutor
-from functools import lru_cache
+from functools import lru_cache, wraps
+from heapq import nlargest
+from operator import itemgetter
+
+def ttl_cache(seconds):
+    """Memoize a function's result per argument set for a fixed number of seconds"""
+    def decorator(func):
+        cache = {}
+        lock = Lock()
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items())))
+            with lock:
+                now = time.monotonic()
+                entry = cache.get(key)
+                if entry is not None and entry[1] > now:
+                    return entry[0]
+                value = func(*args, **kwargs)
+                cache[key] = (value, now + seconds)
+                return value
+        return wrapper
+    return decorator
+
+# System constants, fixed for the life of the process
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
 
 # Delta tracking for rate calculations
 class DeltaTracker:
@@ -40,31 +71,71 @@ class DeltaTracker:
             self._data[key] = (value, now)
             return 0.0
 
+    def update_many(self, items):
+        """Update several values under one lock and return {key: delta per second}"""
+        rates = {}
+        with self._lock:
+            now = time.monotonic()
+            data = self._data
+            for key, value in items.items():
+                old = data.get(key)
+                data[key] = (value, now)
+                if old is not None and now > old[1]:
+                    rates[key] = (value - old[0]) / (now - old[1])
+                else:
+                    rates[key] = 0.0
+        return rates
+
 tracker = DeltaTracker()
 
-# Per-core CPU tracking
+# Per-core CPU tracking (parallel idle/total lists, updated in one batch)
 class CoreTracker:
-    __slots__ = ('_cores', '_lock')
+    __slots__ = ('_ids', '_idle', '_total', '_lock')
 
     def __init__(self):
-        self._cores = {}
+        self._ids = ()
+        self._idle = ()
+        self._total = ()
         self._lock = Lock()
 
-    def update(self, core_id, idle, total):
-        """Update core stats and return usage percent"""
+    def update(self, core_ids, idle, total):
+        """Update all cores at once and return usage percents in core order"""
         with self._lock:
-            if core_id in self._cores:
-                old_idle, old_total = self._cores[core_id]
-                idle_delta = idle - old_idle
-                total_delta = total - old_total
-                self._cores[core_id] = (idle, total)
-                if total_delta > 0:
-                    return round((1.0 - idle_delta / total_delta) * 100, 1)
-            self._cores[core_id] = (idle, total)
-            return 0.0
+            usage = []
+            # Only diff against the previous sample if the core set is unchanged
+            if core_ids == self._ids:
+                for i, t, old_i, old_t in zip(idle, total, self._idle, self._total):
+                    total_delta = t - old_t
+                    if total_delta > 0:
+                        usage.append(round((1.0 - (i - old_i) / total_delta) * 100, 1))
+                    else:
+                        usage.append(0.0)
+            else:
+                usage = [0.0] * len(core_ids)
+            self._ids, self._idle, self._total = core_ids, idle, total
+            return usage
 
 core_tracker = CoreTracker()
 
+# Per-process CPU tick tracking for CPU percent between scrapes
+class ProcessTracker:
+    __slots__ = ('_ticks', '_time', '_lock')
+
+    def __init__(self):
+        self._ticks = {}
+        self._time = 0.0
+        self._lock = Lock()
+
+    def swap(self, ticks):
+        """Store {pid: (starttime, cpu_ticks)} and return (previous ticks, seconds since then)"""
+        with self._lock:
+            now = time.monotonic()
+            prev, prev_time = self._ticks, self._time
+            self._ticks, self._time = ticks, now
+            return prev, (now - prev_time if prev_time else 0.0)
+
+process_tracker = ProcessTracker()
+
 # Cache static system info
 @lru_cache(maxsize=1)
 def get_static_info():
@@ -74,7 +145,7 @@ def get_static_info():
         'arch': os.uname().machine,
         'cpu_model': 'unknown',
         'cpu_count': os.cpu_count() or 1,
-        'page_size': os.sysconf('SC_PAGE_SIZE'),
+        'page_size': PAGE_SIZE,
     }
 
     # CPU model (first occurrence)
@@ -99,6 +170,20 @@ def get_static_info():
 
     return info
 
+@lru_cache(maxsize=1)
+def get_static_envelope():
+    """Static part of every metrics payload, built once"""
+    static = get_static_info()
+    return {
+        'hostname': static['hostname'],
+        'system': {
+            'os': static['os'],
+            'arch': static['arch'],
+            'cpu_model': static['cpu_model'],
+            'cpu_count': static['cpu_count'],
+        },
+    }
+
 def read_proc_file(path):
     """Fast proc file reader"""
     try:
@@ -107,6 +192,76 @@ def read_proc_file(path):
     except:
         return ''
 
+# Column pickers for the numeric fields we use, applied before int conversion
+_DISKSTATS_FIELDS = itemgetter(3, 5, 7, 9, 12)  # reads, read sectors, writes, write sectors, io ms
+_NET_DEV_FIELDS = itemgetter(0, 1, 2, 3, 8, 9, 10, 11)  # rx/tx bytes, packets, errs, drop
+
+# Interfaces excluded from network stats (loopback and virtual)
+SKIP_IFACES = frozenset(('lo',))
+SKIP_IFACE_PREFIXES = ('veth', 'br-', 'docker')
+
+def is_whole_disk(name):
+    """Match sdX, vdX, xvdX and nvmeNnM devices (whole disks, not partitions)"""
+    if len(name) == 3 and name[:2] in ('sd', 'vd'):
+        return 'a' <= name[2] <= 'z'
+    if len(name) == 4 and name[:3] == 'xvd':
+        return 'a' <= name[3] <= 'z'
+    if name.startswith('nvme'):
+        controller, sep, namespace = name[4:].partition('n')
+        return bool(sep) and controller.isdigit() and namespace.isdigit()
+    return False
+
+def keep_interface(iface):
+    """Whether an interface should be reported in network stats"""
+    return iface not in SKIP_IFACES and not iface.startswith(SKIP_IFACE_PREFIXES)
+
+# /proc/meminfo keys used by get_memory
+MEMINFO_KEYS = frozenset(('MemTotal', 'MemAvailable', 'Buffers', 'Cached', 'Slab',
+                          'SwapTotal', 'SwapFree'))
+
+def parse_meminfo(content, keys):
+    """Parse /proc/meminfo into {key: bytes} for the given keys only"""
+    mem = {}
+    for line in content.split('\n'):
+        key, sep, value = line.partition(':')
+        if sep and key in keys:
+            mem[key] = int(value.split()[0]) * 1024  # KB to bytes
+            if len(mem) == len(keys):
+                break
+    return mem
+
+def parse_diskstats(content, keep):
+    """Parse /proc/diskstats into [(name, fields)] for device names accepted by keep"""
+    rows = []
+    for line in content.split('\n'):
+        parts = line.split()
+        if len(parts) < 14 or not keep(parts[2]):
+            continue
+        rows.append((parts[2], tuple(map(int, _DISKSTATS_FIELDS(parts)))))
+    return rows
+
+def parse_net_dev(content, keep):
+    """Parse /proc/net/dev into [(iface, fields)] for interfaces accepted by keep"""
+    rows = []
+    for line in content.split('\n')[2:]:  # Skip headers
+        iface, sep, stats = line.partition(':')
+        if not sep:
+            continue
+        iface = iface.strip()
+        stats = stats.split()
+        if len(stats) < 16 or not keep(iface):
+            continue
+        rows.append((iface, tuple(map(int, _NET_DEV_FIELDS(stats)))))
+    return rows
+
+def _read_small(path, size=4096):
+    """Read a small proc file as bytes with a single os.read"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        return os.read(fd, size)
+    finally:
+        os.close(fd)
+
 def get_uptime_boot():
     """Get uptime and boot time"""
     try:
@@ -121,15 +276,38 @@ def get_cpu():
     """Get CPU usage with delta tracking"""
     try:
         content = read_proc_file('/proc/stat')
-        lines = content.split('\n')
 
-        # Overall CPU
-        fields = [int(x) for x in lines[0].split()[1:8]]
-        idle = fields[3] + fields[4]  # idle + iowait
-        total = sum(fields)
+        # Single pass over /proc/stat: aggregate, per-core, ctxt and procs lines
+        idle = total = 0
+        core_ids = []
+        core_idle = []
+        core_total = []
+        ctxt = 0
+        procs_running = 0
+        procs_blocked = 0
+        for line in content.split('\n'):
+            if line.startswith('cpu'):
+                parts = line.split()
+                fields = list(map(int, parts[1:8]))
+                if len(parts[0]) == 3:
+                    # Overall CPU
+                    idle = fields[3] + fields[4]  # idle + iowait
+                    total = sum(fields)
+                else:
+                    core_ids.append(int(parts[0][3:]))
+                    core_idle.append(fields[3] + fields[4])
+                    core_total.append(sum(fields))
+            elif line.startswith('ctxt '):
+                ctxt = int(line[5:])
+            elif line.startswith('procs_running '):
+                procs_running = int(line[14:])
+            elif line.startswith('procs_blocked '):
+                procs_blocked = int(line[14:])
+                break  # Last line we need
 
-        idle_rate = tracker.update('cpu_idle', idle)
-        total_rate = tracker.update('cpu_total', total)
+        rates = tracker.update_many({'cpu_idle': idle, 'cpu_total': total, 'ctxt': ctxt})
+        idle_rate = rates['cpu_idle']
+        total_rate = rates['cpu_total']
 
         if total_rate > 0:
             percent = round((1.0 - idle_rate / total_rate) * 100, 1)
@@ -137,55 +315,35 @@ def get_cpu():
             percent = 0.0
         percent = max(0, min(100, percent))
 
-        # Per-core CPU
-        cores = []
-        for line in lines[1:]:
-            if line.startswith('cpu') and len(line) > 3 and line[3].isdigit():
-                parts = line.split()
-                core_id = int(parts[0][3:])
-                fields = [int(x) for x in parts[1:8]]
-                c_idle = fields[3] + fields[4]
-                c_total = sum(fields)
-                usage = core_tracker.update(core_id, c_idle, c_total)
-                cores.append({'id': core_id, 'percent': max(0, min(100, usage))})
-
-        # Context switches and processes
-        ctxt = 0
-        procs_running = 0
-        procs_blocked = 0
-        for line in lines:
-            if line.startswith('ctxt '):
-                ctxt = int(line.split()[1])
-            elif line.startswith('procs_running '):
-                procs_running = int(line.split()[1])
-            elif line.startswith('procs_blocked '):
-                procs_blocked = int(line.split()[1])
-
-        ctxt_rate = tracker.update('ctxt', ctxt)
+        # Per-core CPU, diffed in one batch and emitted as parallel arrays
+        usage = core_tracker.update(tuple(core_ids), core_idle, core_total)
+        cores = {
+            'ids': core_ids,
+            'percents': [max(0, min(100, pct)) for pct in usage]
+        }
 
         return {
             'percent': percent,
             'cores': cores,
-            'context_switches_sec': round(ctxt_rate, 1),
+            'context_switches_sec': round(rates['ctxt'], 1),
             'procs_running': procs_running,
             'procs_blocked': procs_blocked
         }
     except:
-        return {'percent': 0, 'cores': [], 'context_switches_sec': 0}
+        return {'percent': 0, 'cores': {'ids': [], 'percents': []}, 'context_switches_sec': 0}
 
 def get_cpu_freq():
     """Get CPU frequency from sysfs"""
     try:
         freqs = []
-        cpu_path = '/sys/devices/system/cpu'
-        for entry in os.listdir(cpu_path):
-            if entry.startswith('cpu') and entry[3:].isdigit():
-                freq_path = f'{cpu_path}/{entry}/cpufreq/scaling_cur_freq'
-                try:
-                    with open(freq_path, 'r') as f:
-                        freqs.append(int(f.read().strip()) / 1000)  # kHz to MHz
-                except:
-                    pass
+        with os.scandir('/sys/devices/system/cpu') as it:
+            cpu_dirs = [e.path for e in it if e.name.startswith('cpu') and e.name[3:].isdigit()]
+        for cpu_dir in cpu_dirs:
+            try:
+                with open(f'{cpu_dir}/cpufreq/scaling_cur_freq', 'r') as f:
+                    freqs.append(int(f.read().strip()) / 1000)  # kHz to MHz
+            except:
+                pass
         if freqs:
             return {
                 'current_mhz': round(sum(freqs) / len(freqs), 0),
@@ -202,42 +360,43 @@ def get_temperatures():
 
     # Thermal zones
     try:
-        thermal_path = '/sys/class/thermal'
-        for zone in os.listdir(thermal_path):
-            if zone.startswith('thermal_zone'):
+        with os.scandir('/sys/class/thermal') as it:
+            zones = [e.path for e in it if e.name.startswith('thermal_zone')]
+        for zone_path in zones:
+            try:
+                with open(f'{zone_path}/temp', 'r') as f:
+                    temp = int(f.read().strip()) / 1000.0
+                name = 'unknown'
                 try:
-                    with open(f'{thermal_path}/{zone}/temp', 'r') as f:
-                        temp = int(f.read().strip()) / 1000.0
-                    name = 'unknown'
-                    try:
-                        with open(f'{thermal_path}/{zone}/type', 'r') as f:
-                            name = f.read().strip()
-                    except:
-                        pass
-                    temps.append({'name': name, 'celsius': round(temp, 1)})
+                    with open(f'{zone_path}/type', 'r') as f:
+                        name = f.read().strip()
                 except:
                     pass
+                temps.append({'name': name, 'celsius': round(temp, 1)})
+            except:
+                pass
     except:
         pass
 
     # hwmon sensors (CPU package temp, etc)
     try:
-        hwmon_path = '/sys/class/hwmon'
-        for hw in os.listdir(hwmon_path):
-            hw_path = f'{hwmon_path}/{hw}'
+        with os.scandir('/sys/class/hwmon') as it:
+            hw_paths = [e.path for e in it]
+        for hw_path in hw_paths:
             try:
-                for f in os.listdir(hw_path):
-                    if f.startswith('temp') and f.endswith('_input'):
-                        prefix = f[:-6]  # tempN
-                        with open(f'{hw_path}/{f}', 'r') as tf:
-                            temp = int(tf.read().strip()) / 1000.0
-                        name = prefix
-                        try:
-                            with open(f'{hw_path}/{prefix}_label', 'r') as lf:
-                                name = lf.read().strip()
-                        except:
-                            pass
-                        temps.append({'name': name, 'celsius': round(temp, 1)})
+                with os.scandir(hw_path) as it:
+                    inputs = [e.name for e in it if e.name.startswith('temp') and e.name.endswith('_input')]
+                for f in inputs:
+                    prefix = f[:-6]  # tempN
+                    with open(f'{hw_path}/{f}', 'r') as tf:
+                        temp = int(tf.read().strip()) / 1000.0
+                    name = prefix
+                    try:
+                        with open(f'{hw_path}/{prefix}_label', 'r') as lf:
+                            name = lf.read().strip()
+                    except:
+                        pass
+                    temps.append({'name': name, 'celsius': round(temp, 1)})
             except:
                 pass
     except:
@@ -248,12 +407,7 @@ def get_temperatures():
 def get_memory():
     """Get memory and swap from single meminfo read"""
     try:
-        content = read_proc_file('/proc/meminfo')
-        mem = {}
-        for line in content.split('\n'):
-            if ':' in line:
-                key, val = line.split(':', 1)
-                mem[key.strip()] = int(val.split()[0]) * 1024  # KB to bytes
+        mem = parse_meminfo(read_proc_file('/proc/meminfo'), MEMINFO_KEYS)
 
         total = mem.get('MemTotal', 0)
         available = mem.get('MemAvailable', 0)
@@ -343,28 +497,21 @@ def get_disk_io():
     io_stats = []
     try:
         content = read_proc_file('/proc/diskstats')
-        for line in content.split('\n'):
-            parts = line.split()
-            if len(parts) < 14:
-                continue
-
-            name = parts[2]
-            # Only major disks, not partitions
-            if not re.match(r'^(sd[a-z]|vd[a-z]|nvme\d+n\d+|xvd[a-z])$', name):
-                continue
-
-            reads = int(parts[3])
-            read_sectors = int(parts[5])
-            writes = int(parts[7])
-            write_sectors = int(parts[9])
-            io_time = int(parts[12])  # ms spent doing I/O
-
-            read_bytes = read_sectors * 512
-            write_bytes = write_sectors * 512
-
-            read_rate = tracker.update(f'disk_{name}_read', read_bytes)
-            write_rate = tracker.update(f'disk_{name}_write', write_bytes)
-            io_rate = tracker.update(f'disk_{name}_io', io_time)
+        # Only major disks, not partitions
+        disks = parse_diskstats(content, is_whole_disk)
+
+        # Compute all disk rates with a single tracker update
+        counters = {}
+        for name, (_, read_sectors, _, write_sectors, io_time) in disks:
+            counters[f'disk_{name}_read'] = read_sectors * 512
+            counters[f'disk_{name}_write'] = write_sectors * 512
+            counters[f'disk_{name}_io'] = io_time  # ms spent doing I/O
+        rates = tracker.update_many(counters)
+
+        for name, (reads, _, writes, _, _) in disks:
+            read_rate = rates[f'disk_{name}_read']
+            write_rate = rates[f'disk_{name}_write']
+            io_rate = rates[f'disk_{name}_io']
 
             io_stats.append({
                 'device': name,
@@ -384,32 +531,20 @@ def get_network():
     interfaces = []
     try:
         content = read_proc_file('/proc/net/dev')
-        for line in content.split('\n')[2:]:  # Skip headers
-            if ':' not in line:
-                continue
-
-            parts = line.split(':')
-            iface = parts[0].strip()
+        # Skip loopback and virtual interfaces
+        ifaces = parse_net_dev(content, keep_interface)
 
-            # Skip loopback and virtual interfaces
-            if iface in ('lo',) or iface.startswith(('veth', 'br-', 'docker')):
-                continue
-
-            stats = parts[1].split()
-            if len(stats) < 16:
-                continue
+        # Compute all interface rates with a single tracker update
+        counters = {}
+        for iface, fields in ifaces:
+            counters[f'net_{iface}_rx'] = fields[0]
+            counters[f'net_{iface}_tx'] = fields[4]
+        rates = tracker.update_many(counters)
 
-            rx_bytes = int(stats[0])
-            rx_packets = int(stats[1])
-            rx_errors = int(stats[2])
-            rx_dropped = int(stats[3])
-            tx_bytes = int(stats[8])
-            tx_packets = int(stats[9])
-            tx_errors = int(stats[10])
-            tx_dropped = int(stats[11])
-
-            rx_rate = tracker.update(f'net_{iface}_rx', rx_bytes)
-            tx_rate = tracker.update(f'net_{iface}_tx', tx_bytes)
+        for iface, (rx_bytes, rx_packets, rx_errors, rx_dropped,
+                    tx_bytes, tx_packets, tx_errors, tx_dropped) in ifaces:
+            rx_rate = rates[f'net_{iface}_rx']
+            tx_rate = rates[f'net_{iface}_tx']
 
             interfaces.append({
                 'interface': iface,
@@ -458,13 +593,12 @@ def get_tcp_connections():
 def get_load():
     """Get load averages and process counts"""
     try:
-        content = read_proc_file('/proc/loadavg')
-        parts = content.split()
-        running, total = parts[3].split('/')
+        # "0.12 0.34 0.56 2/345 6789" -> one split for all fields
+        load1, load5, load15, running, total, _ = read_proc_file('/proc/loadavg').replace('/', ' ').split()
         return {
-            'load1': float(parts[0]),
-            'load5': float(parts[1]),
-            'load15': float(parts[2]),
+            'load1': float(load1),
+            'load5': float(load5),
+            'load15': float(load15),
             'processes_running': int(running),
             'processes_total': int(total)
         }
@@ -494,299 +628,371 @@ def get_entropy():
     except:
         return None
 
-def get_top_processes(n=10):
-    """Get top processes by reading /proc directly (no subprocess)"""
-    processes = []
-    page_size = os.sysconf('SC_PAGE_SIZE')
-    clock_ticks = os.sysconf('SC_CLK_TCK')
+def get_top_processes(n=10, uptime=None):
+    """Get top processes by reading /proc directly (no subprocess), as parallel arrays"""
+    processes = {'pids': [], 'names': [], 'cpu': [], 'mem_rss': [], 'mem_virt': []}
 
-    # Get total system uptime for CPU calculation
-    try:
-        with open('/proc/uptime', 'r') as f:
-            uptime = float(f.read().split()[0])
-    except:
-        return []
+    # Get total system uptime for CPU calculation (unless the caller has it)
+    if not uptime:
+        try:
+            with open('/proc/uptime', 'r') as f:
+                uptime = float(f.read().split()[0])
+        except:
+            return processes
 
     try:
-        pids = [p for p in os.listdir('/proc') if p.isdigit()]
-        proc_data = []
+        with os.scandir('/proc') as it:
+            pids = [e.name for e in it if e.name[0].isdigit() and e.name.isdigit()]
 
+        # First pass: only CPU ticks are converted for every process
+        rows = []
+        ticks = {}
         for pid in pids:
             try:
                 # Read stat for CPU info
-                with open(f'/proc/{pid}/stat', 'r') as f:
-                    stat = f.read()
+                stat = _read_small(f'/proc/{pid}/stat')
 
                 # Parse stat (handle command names with spaces/parens)
-                comm_start = stat.index('(')
-                comm_end = stat.rindex(')')
-                comm = stat[comm_start+1:comm_end]
+                comm_start = stat.index(b'(')
+                comm_end = stat.rindex(b')')
                 fields = stat[comm_end+2:].split()
 
-                utime = int(fields[11])
-                stime = int(fields[12])
-                starttime = int(fields[19])
-                vsize = int(fields[20])  # Virtual memory
-                rss = int(fields[21]) * page_size  # Resident memory
-
-                # Calculate CPU percent
-                total_time = utime + stime
-                proc_uptime = uptime - (starttime / clock_ticks)
-                if proc_uptime > 0:
-                    cpu_percent = (total_time / clock_ticks / proc_uptime) * 100
-                else:
-                    cpu_percent = 0
-
-                proc_data.append({
-                    'pid': int(pid),
-                    'name': comm[:15],  # Limit name length
-                    'cpu': round(cpu_percent, 1),
-                    'mem_rss': rss,
-                    'mem_virt': vsize
-                })
+                total_time = int(fields[11]) + int(fields[12])  # utime + stime
+                ticks[pid] = (fields[19], total_time)
+                rows.append((pid, stat[comm_start+1:comm_end], fields, total_time))
             except:
                 continue
 
-        # Sort by CPU and take top n
-        proc_data.sort(key=lambda x: x['cpu'], reverse=True)
-        processes = proc_data[:n]
+        prev, elapsed = process_tracker.swap(ticks)
+
+        def lifetime_percent(total_time, fields):
+            """Average CPU percent over the process lifetime"""
+            proc_uptime = uptime - (int(fields[19]) / CLOCK_TICKS)
+            if proc_uptime > 0:
+                return (total_time / CLOCK_TICKS / proc_uptime) * 100
+            return 0
+
+        # CPU percent since the last scrape; lifetime average for new processes
+        active = []
+        idle = []
+        for pid, comm, fields, total_time in rows:
+            old = prev.get(pid)
+            if elapsed > 0 and old is not None and old[0] == fields[19]:
+                cpu_percent = (total_time - old[1]) / CLOCK_TICKS / elapsed * 100
+            else:
+                cpu_percent = lifetime_percent(total_time, fields)
+            if cpu_percent > 0:
+                active.append((cpu_percent, pid, comm, fields))
+            else:
+                idle.append((pid, comm, fields, total_time))
+
+        # Rank only processes that used CPU; pad with the idle processes that
+        # have the highest lifetime CPU if needed.
+        top = nlargest(n, active, key=itemgetter(0))
+        if len(top) < n:
+            padding = nlargest(n - len(top), idle, key=lambda row: lifetime_percent(row[3], row[2]))
+            top += [(0.0, pid, comm, fields) for pid, comm, fields, _ in padding]
+
+        for cpu_percent, pid, comm, fields in top:
+            processes['pids'].append(int(pid))
+            processes['names'].append(comm.decode('utf-8', 'replace')[:15])  # Limit name length
+            processes['cpu'].append(round(cpu_percent, 1))
+            processes['mem_rss'].append(int(fields[21]) * PAGE_SIZE)  # Resident memory
+            processes['mem_virt'].append(int(fields[20]))  # Virtual memory
     except:
         pass
 
     return processes
 
+# Docker API connections, kept open between scrapes (HTTP/1.1 keep-alive).
+# One per collector thread, so the containers and events queries don't wait
+# on each other.
+DOCKER_SOCKET = '/var/run/docker.sock'
+_docker_local = local()
+
+class DockerConnection(http.client.HTTPConnection):
+    """HTTP connection to the Docker daemon over its Unix socket"""
+
+    def __init__(self, socket_path, timeout=1):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except:
+            sock.close()
+            raise
+        self.sock = sock
+
+def _docker_get(path):
+    """GET a Docker API path over the Unix socket and return the decoded body"""
+    conn = getattr(_docker_local, 'conn', None)
+    if conn is None:
+        conn = _docker_local.conn = DockerConnection(DOCKER_SOCKET)
+
+    for attempt in range(2):
+        reused = conn.sock is not None
+        try:
+            conn.request('GET', path)
+            response = conn.getresponse()
+            body = response.read()
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            conn.close()
+            if reused and not attempt:
+                continue  # Daemon dropped the idle keep-alive connection; reconnect once
+            raise
+        except:
+            # Timeouts and connect failures are not retried
+            conn.close()
+            raise
+
+        return body if response.status == 200 else None
+
+@ttl_cache(5)
 def get_containers():
     """Get running Docker containers via Unix socket"""
     containers = []
     try:
-        # Connect to Docker daemon via Unix socket with timeout
-        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-        sock.settimeout(2)
-        sock.connect('/var/run/docker.sock')
-
-        # Send HTTP request to Docker API (only get running containers)
-        request = b'GET /containers/json?all=false HTTP/1.1\r\nHost: localhost\r\n\r\n'
-        sock.sendall(request)
-
-        # Read response with multiple smaller reads
-        response = b''
-        sock.settimeout(1)
-        for _ in range(100):  # Max 100 chunks
-            try:
-                chunk = sock.recv(1024)
-                if not chunk:
-                    break
-                response += chunk
-                # If we have a complete response, break
-                if b'\r\n0\r\n\r\n' in response or len(response) > 50000:
-                    break
-            except socket.timeout:
-                break
-
-        sock.close()
-
-        # Parse HTTP response (skip headers)
-        if b'\r\n\r\n' in response:
-            headers, body = response.split(b'\r\n\r\n', 1)
-
-            # Handle chunked encoding - look for JSON data
-            # The response will have chunk size prefixes like "123\r\n{...}\r\n0\r\n\r\n"
-            # We need to extract just the JSON part
-
-            # Find JSON array start
-            json_start = body.find(b'[')
-            if json_start >= 0:
-                # Find matching end bracket with depth tracking
-                depth = 0
-                json_end = json_start
-                for i in range(json_start, min(len(body), json_start + 50000)):  # Limit search
-                    if body[i:i+1] == b'[':
-                        depth += 1
-                    elif body[i:i+1] == b']':
-                        depth -= 1
-                        if depth == 0:
-                            json_end = i + 1
-                            break
-
-                json_str = body[json_start:json_end].decode('utf-8')
-                data = json.loads(json_str)
-
-                # Parse container data
-                for container in data:
-                    # Get first name
-                    names = container.get('Names', [])
-                    if not names:
-                        continue
-                    name = names[0].lstrip('/')
-
-                    # Get image (shorten if needed)
-                    image = container.get('Image', '')
-                    if '/' in image:
-                        image = image.split('/')[-1]
-
-                    # Get state
-                    state = container.get('State', 'unknown')
-
-                    containers.append({
-                        'name': name,
-                        'status': state,
-                        'image': image
-                    })
+        # Only get running containers
+        body = _docker_get('/containers/json?all=false')
+        if body:
+            data = json.loads(body)
+
+            # Parse container data
+            for container in data:
+                # Get first name
+                names = container.get('Names', [])
+                if not names:
+                    continue
+                name = names[0].lstrip('/')
+
+                # Get image (shorten if needed)
+                image = container.get('Image', '')
+                if '/' in image:
+                    image = image.split('/')[-1]
+
+                # Get state
+                state = container.get('State', 'unknown')
+
+                containers.append({
+                    'name': name,
+                    'status': state,
+                    'image': image
+                })
     except Exception as e:
         # On any error, return empty list
         pass
 
     return containers
 
+# Optional native journald access (python-systemd); falls back to journalctl,
+# and journal sources are skipped when neither is available
+try:
+    from systemd import journal
+except ImportError:
+    journal = None
+
+JOURNALCTL = None if journal is not None else shutil.which('journalctl')
+
+# Journal readers are reused across scrapes, keyed by (unit, priority)
+_journal_readers = {}
+
+CADDY_REQUEST_RE = re.compile(r'"(GET|POST|PUT|DELETE)\s+([^\s"]+)[^"]*"\s+(\d+)')
+SSH_ACCEPTED_RE = re.compile(r'Accepted (\w+) for (\w+)')
+
+def get_journal_entries(n, unit=None, priority=None):
+    """Get the n most recent journal entries as (timestamp, unit, message), oldest first"""
+    entries = []
+
+    if journal is not None:
+        key = (unit, priority)
+        reader = _journal_readers.get(key)
+        if reader is None:
+            reader = journal.Reader()
+            reader.this_boot()
+            if unit:
+                reader.add_match(_SYSTEMD_UNIT=unit)
+            if priority is not None:
+                reader.log_level(priority)
+            reader.fileno()  # Set up inotify so rotated journal files are picked up
+            _journal_readers[key] = reader
+
+        reader.process()  # Apply pending journal file changes (rotation, new files)
+        reader.seek_tail()
+        for _ in range(n):
+            entry = reader.get_previous()
+            if not entry:
+                break
+            ts = entry.get('__REALTIME_TIMESTAMP')
+            entries.append((
+                int(ts.timestamp()) if ts else 0,
+                entry.get('_SYSTEMD_UNIT', 'system'),
+                str(entry.get('MESSAGE', ''))
+            ))
+        entries.reverse()
+        return entries
+
+    if JOURNALCTL is None:
+        return entries
+
+    import subprocess
+    cmd = [JOURNALCTL, '-n', str(n), '--no-pager', '-o', 'json',
+           '--output-fields=MESSAGE,_SYSTEMD_UNIT,__REALTIME_TIMESTAMP']
+    if unit:
+        cmd += ['-u', unit]
+    if priority is not None:
+        cmd += ['-p', str(priority)]
+    result = subprocess.run(cmd, capture_output=True, text=True, timeout=2)
+    if result.returncode == 0:
+        for line in result.stdout.strip().split('\n'):
+            if line:
+                try:
+                    entry = json.loads(line)
+                    entries.append((
+                        int(entry.get('__REALTIME_TIMESTAMP', 0)) // 1000000,
+                        entry.get('_SYSTEMD_UNIT', 'system'),
+                        str(entry.get('MESSAGE', ''))
+                    ))
+                except:
+                    pass
+    return entries
+
+def format_log_time(ts):
+    """Format a unix timestamp as local HH:MM:SS"""
+    return datetime.fromtimestamp(ts).strftime('%H:%M:%S') if ts else '--:--:--'
+
+@ttl_cache(10)
 def get_recent_logs(max_entries=10):
     """Get recent safe log entries from various sources"""
-    import subprocess
     logs = []
 
     # Docker events (recent container actions - safe, no sensitive info)
     try:
-        result = subprocess.run(
-            ['docker', 'events', '--since', '5m', '--until', '0s',
-             '--format', '{{.Action}} {{.Actor.Attributes.name}}'],
-            capture_output=True, text=True, timeout=2
-        )
-        if result.returncode == 0:
-            now = datetime.now()
-            for line in result.stdout.strip().split('\n')[-5:]:
-                if line and ' ' in line:
-                    parts = line.split(' ', 1)
-                    action = parts[0]
-                    name = parts[1] if len(parts) > 1 else ''
-                    # Skip exec events (too noisy)
-                    if action.startswith('exec_'):
-                        continue
-                    logs.append({
-                        'time': now.strftime('%H:%M:%S'),
-                        'level': 'info',
-                        'source': 'docker',
-                        'message': f"{name} {action}"
-                    })
+        now = int(time.time())
+        body = _docker_get(f'/events?since={now - 300}&until={now}'
+                           '&filters=%7B%22type%22%3A%5B%22container%22%5D%7D')
+        if body:
+            events = []
+            for line in body.split(b'\n'):
+                if line.strip():
+                    events.append(json.loads(line))
+            for event in events[-5:]:
+                action = event.get('Action', '')
+                name = event.get('Actor', {}).get('Attributes', {}).get('name', '')
+                # Skip exec events (too noisy)
+                if not action or action.startswith('exec_'):
+                    continue
+                logs.append({
+                    'time': format_log_time(event.get('time', now)),
+                    'level': 'info',
+                    'source': 'docker',
+                    'message': f"{name} {action}"
+                })
     except:
         pass
 
-    # Caddy access logs - just endpoints, no IPs (from journalctl)
+    # Caddy access logs - just endpoints, no IPs
     try:
-        result = subprocess.run(
-            ['journalctl', '-u', 'caddy', '-n', '20', '--no-pager', '-o', 'cat'],
-            capture_output=True, text=True, timeout=2
-        )
-        if result.returncode == 0:
-            for line in result.stdout.strip().split('\n')[-5:]:
-                if '"GET ' in line or '"POST ' in line:
-                    # Extract just method, path, and status
-                    import re
-                    match = re.search(r'"(GET|POST|PUT|DELETE)\s+([^\s"]+)[^"]*"\s+(\d+)', line)
-                    if match:
-                        method, path, status = match.groups()
-                        level = 'success' if status.startswith('2') else 'warn' if status.startswith('4') else 'info'
-                        logs.append({
-                            'time': datetime.now().strftime('%H:%M:%S'),
-                            'level': level,
-                            'source': 'caddy',
-                            'message': f"{method} {path[:30]} [{status}]"
-                        })
+        for ts, _, line in get_journal_entries(20, unit='caddy.service')[-5:]:
+            if '"GET ' in line or '"POST ' in line:
+                # Extract just method, path, and status
+                match = CADDY_REQUEST_RE.search(line)
+                if match:
+                    method, path, status = match.groups()
+                    level = 'success' if status.startswith('2') else 'warn' if status.startswith('4') else 'info'
+                    logs.append({
+                        'time': format_log_time(ts),
+                        'level': level,
+                        'source': 'caddy',
+                        'message': f"{method} {path[:30]} [{status}]"
+                    })
     except:
         pass
 
     # System service events (safe - just service names)
     try:
-        result = subprocess.run(
-            ['journalctl', '-p', '4', '-n', '10', '--no-pager',
-             '-o', 'json', '--output-fields=MESSAGE,_SYSTEMD_UNIT,__REALTIME_TIMESTAMP'],
-            capture_output=True, text=True, timeout=2
-        )
-        if result.returncode == 0:
-            for line in result.stdout.strip().split('\n')[-3:]:
-                if line:
-                    try:
-                        entry = json.loads(line)
-                        msg = entry.get('MESSAGE', '')[:50]
-                        unit = entry.get('_SYSTEMD_UNIT', 'system')
-                        ts = int(entry.get('__REALTIME_TIMESTAMP', 0)) // 1000000
-                        time_str = datetime.fromtimestamp(ts).strftime('%H:%M:%S') if ts else '--:--:--'
-                        # Skip noisy/sensitive entries
-                        if any(skip in msg.lower() for skip in ['password', 'key', 'secret', 'token', 'auth']):
-                            continue
-                        logs.append({
-                            'time': time_str,
-                            'level': 'warn',
-                            'source': unit.replace('.service', '')[:10],
-                            'message': msg
-                        })
-                    except:
-                        pass
+        for ts, unit, msg in get_journal_entries(10, priority=4)[-3:]:
+            msg = msg[:50]
+            # Skip noisy/sensitive entries
+            if any(skip in msg.lower() for skip in ['password', 'key', 'secret', 'token', 'auth']):
+                continue
+            logs.append({
+                'time': format_log_time(ts),
+                'level': 'warn',
+                'source': unit.replace('.service', '')[:10],
+                'message': msg
+            })
     except:
         pass
 
     # SSH logins (successful only - safe)
     try:
-        result = subprocess.run(
-            ['journalctl', '-u', 'sshd', '-n', '20', '--no-pager', '-o', 'cat'],
-            capture_output=True, text=True, timeout=2
-        )
-        if result.returncode == 0:
-            for line in result.stdout.strip().split('\n'):
-                if 'Accepted' in line:
-                    # Extract just user and method, not IP
-                    import re
-                    match = re.search(r'Accepted (\w+) for (\w+)', line)
-                    if match:
-                        method, user = match.groups()
-                        logs.append({
-                            'time': datetime.now().strftime('%H:%M:%S'),
-                            'level': 'success',
-                            'source': 'ssh',
-                            'message': f"Login: {user} via {method}"
-                        })
+        for ts, _, line in get_journal_entries(20, unit='sshd.service'):
+            if 'Accepted' in line:
+                # Extract just user and method, not IP
+                match = SSH_ACCEPTED_RE.search(line)
+                if match:
+                    method, user = match.groups()
+                    logs.append({
+                        'time': format_log_time(ts),
+                        'level': 'success',
+                        'source': 'ssh',
+                        'message': f"Login: {user} via {method}"
+                    })
     except:
         pass
 
     # Sort by time and limit
     return logs[-max_entries:]
 
-def collect_metrics():
-    """Collect all metrics efficiently using thread pool"""
-    static = get_static_info()
+def utc_timestamp():
+    """Current UTC time as ISO 8601 with milliseconds (e.g. 2024-01-01T12:00:00.123Z)"""
+    t = time.time()
+    return time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(t)) + f'.{int(t % 1 * 1000):03d}Z'
 
-    # Parallel collection for independent metrics
-    with ThreadPoolExecutor(max_workers=8) as executor:
-        futures = {
-            'uptime': executor.submit(get_uptime_boot),
-            'cpu': executor.submit(get_cpu),
-            'cpu_freq': executor.submit(get_cpu_freq),
-            'temps': executor.submit(get_temperatures),
-            'memory': executor.submit(get_memory),
-            'filesystems': executor.submit(get_filesystems),
-            'disk_io': executor.submit(get_disk_io),
-            'network': executor.submit(get_network),
-            'tcp': executor.submit(get_tcp_connections),
-            'load': executor.submit(get_load),
-            'fds': executor.submit(get_file_descriptors),
-            'entropy': executor.submit(get_entropy),
-            'processes': executor.submit(get_top_processes),
-            'containers': executor.submit(get_containers),
-            'logs': executor.submit(get_recent_logs),
-        }
+# Persistent worker pool so collector threads stay warm between scrapes
+_POOL = ThreadPoolExecutor(max_workers=6, thread_name_prefix='metrics')
+atexit.register(_POOL.shutdown)
 
-        results = {k: v.result() for k, v in futures.items()}
+def collect_metrics():
+    """Collect all metrics, offloading only the slow collectors to the thread pool"""
+    # Uptime first so the process collector can reuse it
+    uptime = get_uptime_boot()
+
+    # Collectors that can block (sockets, subprocesses, statvfs, many small files)
+    futures = {
+        'cpu_freq': _POOL.submit(get_cpu_freq),
+        'temps': _POOL.submit(get_temperatures),
+        'filesystems': _POOL.submit(get_filesystems),
+        'processes': _POOL.submit(get_top_processes, uptime=uptime['uptime_seconds']),
+        'containers': _POOL.submit(get_containers),
+        'logs': _POOL.submit(get_recent_logs),
+    }
+
+    # Single-file /proc reads are cheaper than a thread handoff; run them inline
+    results = {
+        'uptime': uptime,
+        'cpu': get_cpu(),
+        'memory': get_memory(),
+        'disk_io': get_disk_io(),
+        'network': get_network(),
+        'tcp': get_tcp_connections(),
+        'load': get_load(),
+        'fds': get_file_descriptors(),
+        'entropy': get_entropy(),
+    }
+    for key, future in futures.items():
+        results[key] = future.result()
 
     mem_data = results['memory']
 
     metrics = {
         'agent_version': AGENT_VERSION,
-        'timestamp': datetime.utcnow().isoformat() + 'Z',
-        'hostname': static['hostname'],
-        'system': {
-            'os': static['os'],
-            'arch': static['arch'],
-            'cpu_model': static['cpu_model'],
-            'cpu_count': static['cpu_count'],
-        },
+        'timestamp': utc_timestamp(),
+        **get_static_envelope(),
         'uptime': results['uptime'],
         'cpu': results['cpu'],
         'memory': mem_data['memory'],
@@ -813,72 +1019,171 @@ def collect_metrics():
 
     return metrics
 
-class MetricsHandler(BaseHTTPRequestHandler):
-    protocol_version = 'HTTP/1.1'
-
-    def do_GET(self):
-        path = self.path.split('?')[0]
-        query = self.path.split('?')[1] if '?' in self.path else ''
+# Optional fast JSON encoder (orjson); falls back to the stdlib
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def encode_json(obj, compact=False):
+    """Encode obj as JSON bytes, minified or indented"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=0 if compact else orjson.OPT_INDENT_2)
+    if compact:
+        return json.dumps(obj, separators=(',', ':')).encode()
+    return json.dumps(obj, indent=2).encode()
+
+# Response cache: scrapes arriving within CACHE_TTL share a single collection.
+# Delta trackers only advance when a collection actually runs, so rates are
+# always computed over windows of at least CACHE_TTL seconds.
+CACHE_TTL = float(os.environ.get('CACHE_TTL', 0.5))
+_cache = {'ts': 0.0, 'metrics': None, 'compact': None, 'pretty': None}
+_cache_lock = Lock()
+
+def get_metrics_body(compact=False):
+    """Get encoded metrics JSON, collecting at most once per CACHE_TTL"""
+    key = 'compact' if compact else 'pretty'
+    with _cache_lock:
+        if _cache['metrics'] is None or time.monotonic() - _cache['ts'] >= CACHE_TTL:
+            _cache['metrics'] = collect_metrics()
+            _cache['compact'] = _cache['pretty'] = None
+            _cache['ts'] = time.monotonic()
+
+        # Encode each format lazily, once per collection
+        if _cache[key] is None:
+            _cache[key] = encode_json(_cache['metrics'], compact)
+        return _cache[key]
+
+def peek_metrics_body(compact=False):
+    """Get cached metrics JSON if fresh and already encoded, without blocking"""
+    if not _cache_lock.acquire(blocking=False):
+        return None  # A collection is in progress
+    try:
+        if _cache['metrics'] is not None and time.monotonic() - _cache['ts'] < CACHE_TTL:
+            return _cache['compact' if compact else 'pretty']
+        return None
+    finally:
+        _cache_lock.release()
+
+# HTTP server: each connection is a coroutine on one event loop, so idle
+# keep-alive clients hold no thread. Only a metrics cache miss uses a worker
+# thread (the loop's default executor, reused across requests).
+SERVER_HEADER = f'metrics-agent/{AGENT_VERSION} Python/{platform.python_version()}'
+KEEPALIVE_TIMEOUT = 15
+HTTP_REASONS = {200: 'OK', 204: 'No Content', 400: 'Bad Request',
+                404: 'Not Found', 405: 'Method Not Allowed'}
+
+def build_response(status, body=b'', headers=()):
+    """Build status line, headers and body as one buffer for a single write"""
+    lines = [
+        f'HTTP/1.1 {status} {HTTP_REASONS[status]}',
+        f'Server: {SERVER_HEADER}',
+        f'Date: {formatdate(usegmt=True)}',
+    ]
+    if status != 204:
+        lines.append(f'Content-Length: {len(body)}')
+    lines.extend(f'{name}: {value}' for name, value in headers)
+    head = '\r\n'.join(lines) + '\r\n\r\n'
+    return head.encode('latin-1') + body
+
+async def handle_request(method, target):
+    """Route one request; returns (status, body, headers)"""
+    path, _, query = target.partition('?')
+
+    if method == 'OPTIONS':
+        return 204, b'', [
+            ('Access-Control-Allow-Methods', 'GET, OPTIONS'),
+            ('Access-Control-Allow-Headers', 'Content-Type'),
+            ('Access-Control-Max-Age', '86400'),
+        ]
+    if method != 'GET':
+        return 405, b'Method Not Allowed', [('Content-Type', 'text/plain'), ('Allow', 'GET, OPTIONS')]
+
+    if path == '/metrics':
         compact = 'compact=1' in query or 'compact=true' in query
+        body = peek_metrics_body(compact)
+        if body is None:
+            body = await asyncio.to_thread(get_metrics_body, compact)
+        return 200, body, [('Content-Type', 'application/json'),
+                           ('Cache-Control', 'no-cache, no-store')]
 
-        if path == '/metrics':
-            metrics = collect_metrics()
-            if compact:
-                body = json.dumps(metrics, separators=(',', ':')).encode()
-            else:
-                body = json.dumps(metrics, indent=2).encode()
-
-            self.send_response(200)
-            self.send_header('Content-Type', 'application/json')
-            self.send_header('Content-Length', len(body))
-            self.send_header('Cache-Control', 'no-cache, no-store')
-            self.end_headers()
-            self.wfile.write(body)
-
-        elif path == '/health':
-            body = b'OK'
-            self.send_response(200)
-            self.send_header('Content-Type', 'text/plain')
-            self.send_header('Content-Length', len(body))
-            self.end_headers()
-            self.wfile.write(body)
+    if path == '/health':
+        return 200, b'OK', [('Content-Type', 'text/plain')]
 
-        else:
-            self.send_error(404)
-
-    def do_OPTIONS(self):
-        self.send_response(204)
-        self.send_header('Access-Control-Allow-Methods', 'GET, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-        self.send_header('Access-Control-Max-Age', '86400')
-        self.end_headers()
-
-    def log_message(self, format, *args):
-        pass  # Suppress access logs
-
-class ThreadedHTTPServer(HTTPServer):
-    """Handle each request in a separate thread"""
-    def process_request(self, request, client_address):
-        thread = Thread(target=self.process_request_thread, args=(request, client_address))
-        thread.daemon = True
-        thread.start()
-
-    def process_request_thread(self, request, client_address):
-        try:
-            self.finish_request(request, client_address)
-        except Exception:
-            self.handle_error(request, client_address)
-        finally:
-            self.shutdown_request(request)
+    return 404, b'Not Found', [('Content-Type', 'text/plain')]
+
+async def handle_connection(reader, writer):
+    """Serve HTTP/1.x requests on one connection until it closes or idles out"""
+    try:
+        while True:
+            try:
+                request_line = await asyncio.wait_for(reader.readline(), KEEPALIVE_TIMEOUT)
+            except asyncio.TimeoutError:
+                break  # Idle keep-alive connection
+            if not request_line:
+                break
+            if request_line in (b'\r\n', b'\n'):
+                continue
+
+            headers = {}
+            while True:
+                line = await asyncio.wait_for(reader.readline(), KEEPALIVE_TIMEOUT)
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+
+            parts = request_line.decode('latin-1').split()
+            if len(parts) != 3 or not parts[2].startswith('HTTP/'):
+                writer.write(build_response(400, b'Bad Request', [('Content-Type', 'text/plain'),
+                                                                  ('Connection', 'close')]))
+                await writer.drain()
+                break
+            method, target, version = parts
+
+            # HTTP/1.1 defaults to keep-alive, HTTP/1.0 must ask for it
+            connection = headers.get('connection', '').lower()
+            if version == 'HTTP/1.1':
+                keep_alive = connection != 'close'
+            else:
+                keep_alive = connection == 'keep-alive'
+
+            # Discard any request body; chunked bodies aren't supported, so close after
+            if 'transfer-encoding' in headers:
+                keep_alive = False
+            length = int(headers.get('content-length') or 0)
+            if length:
+                await reader.readexactly(length)
+
+            status, body, response_headers = await handle_request(method, target)
+            if not keep_alive:
+                response_headers.append(('Connection', 'close'))
+            elif version != 'HTTP/1.1':
+                response_headers.append(('Connection', 'keep-alive'))
+
+            writer.write(build_response(status, body, response_headers))
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError):
+        pass  # Client went away or sent a malformed/oversized request
+    except asyncio.CancelledError:
+        pass  # Server shutting down; end quietly instead of logging the cancellation
+    finally:
+        writer.close()
+
+async def serve(host, port):
+    """Run the HTTP server until cancelled"""
+    server = await asyncio.start_server(handle_connection, host, port)
+    async with server:
+        await server.serve_forever()
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 8000))
-    server = ThreadedHTTPServer(('0.0.0.0', port), MetricsHandler)
     print(f'Metrics agent running on http://0.0.0.0:{port}/metrics')
     print(f'Health check: http://0.0.0.0:{port}/health')
     print(f'Compact mode: http://0.0.0.0:{port}/metrics?compact=1')
     try:
-        server.serve_forever()
+        asyncio.run(serve('0.0.0.0', port))
     except KeyboardInterrupt:
         print('\nShutting down...')
-        server.shutdown()